@@ -18,6 +18,10 @@ IMAGE_OUTPUT_DIR = os.path.join(BASE_UPLOAD_DIR, "generated")
 # e.g. static/organs/heart.jpg, lungs.jpg, etc.
 ORGAN_IMAGE_DIR = os.path.join(BASE_DIR, "static", "organs")
 
+# Extracted images smaller than this are dropped (icons, bullets, spacers)
+MIN_IMAGE_BYTES = int(os.getenv("MIN_IMAGE_BYTES", "1024"))
+MIN_IMAGE_SIDE = int(os.getenv("MIN_IMAGE_SIDE", "16"))
+
 os.makedirs(BASE_UPLOAD_DIR, exist_ok=True)
 os.makedirs(IMAGE_OUTPUT_DIR, exist_ok=True)
 os.makedirs(ORGAN_IMAGE_DIR, exist_ok=True)
@@ -29,3 +33,33 @@ AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-pre
 
 AZURE_OPENAI_CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT") or ""
 AZURE_OPENAI_VISION_DEPLOYMENT = os.getenv("AZURE_OPENAI_VISION_DEPLOYMENT") or ""
+
+# ====== Background prefetch of details / references / labels ======
+# Disabled by default; set PREFETCH_ENABLED=1 to turn it on.
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "0").lower() in ("1", "true", "yes")
+
+# Which generations to prefetch after upload, in priority order.
+PREFETCH_TASKS = [
+    t.strip()
+    for t in os.getenv("PREFETCH_TASKS", "details,references,labeled").split(",")
+    if t.strip()
+]
+
+# LLM calls per minute shared by interactive requests and prefetch (0 = no limit).
+# Interactive calls always go through; a prefetch job only starts if it keeps
+# the total under this, so set it at or below the Azure deployment's limit.
+PREFETCH_MAX_CALLS_PER_MINUTE = int(os.getenv("PREFETCH_MAX_CALLS_PER_MINUTE", "20"))
+
+# Skip label prefetch for PDFs with more images than this (each image is one vision call).
+PREFETCH_MAX_LABEL_IMAGES = int(os.getenv("PREFETCH_MAX_LABEL_IMAGES", "10"))
+
+# Seconds with no interactive request before the prefetcher starts its next job.
+PREFETCH_IDLE_SECONDS = float(os.getenv("PREFETCH_IDLE_SECONDS", "0.5"))
+
+# How long an endpoint waits for an in-flight prefetch of the same item to make
+# progress (finish, or finish one more LLM call) before generating it itself.
+PREFETCH_WAIT_TIMEOUT = float(os.getenv("PREFETCH_WAIT_TIMEOUT", "120"))
+
+# Prefetched results not collected within this many seconds are dropped
+# and their LLM calls counted as wasted.
+PREFETCH_RESULT_TTL = float(os.getenv("PREFETCH_RESULT_TTL", "1800"))
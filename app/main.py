@@ -1,4 +1,5 @@
 from fastapi import FastAPI, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
@@ -6,7 +7,12 @@ from fastapi.staticfiles import StaticFiles
 import uuid
 import os
 
-from .config import BASE_UPLOAD_DIR, IMAGE_OUTPUT_DIR, ORGAN_IMAGE_DIR
+from .config import (
+    BASE_UPLOAD_DIR,
+    IMAGE_OUTPUT_DIR,
+    ORGAN_IMAGE_DIR,
+    PREFETCH_MAX_LABEL_IMAGES,
+)
 from .pdf_utils import save_upload, extract_text, extract_images
 from .ai_utils import (
     summarize_text,
@@ -17,6 +23,13 @@ from .ai_utils import (
     get_static_organ_image,
     identify_organ_with_static_image,
 )
+from .prefetch import (
+    interactive_request,
+    yield_to_interactive,
+    schedule_prefetch,
+    take_prefetched,
+    get_prefetch_metrics,
+)
 
 app = FastAPI(title="Medical PDF Assistant")
 
@@ -61,6 +74,53 @@ def to_organ_url(path: str | None) -> str | None:
     return f"/organs/{rel}"
 
 
+def build_labeled_outputs(image_paths: list[str], pause=None) -> list[dict]:
+    """Identify the organ in each image; `pause` is called between vision calls."""
+    labeled_outputs = []
+
+    for i, img_path in enumerate(image_paths):
+        if pause and i:
+            pause()
+
+        # 1) Identify organ from the extracted image
+        organ_info = identify_organ(img_path)
+        organ = organ_info.get("organ", "unknown")
+        labels = organ_info.get("labels", [])
+
+        # 2) Use static organ PNG from /static/organs
+        static_organ_path = get_static_organ_image(organ)
+
+        labeled_outputs.append(
+            {
+                "original": to_original_url(img_path),
+                "organ": organ,
+                "labels": labels,
+                "labeled_image": static_organ_path,
+                "labeled_image_url": to_organ_url(static_organ_path),
+                "image_generation_status": (
+                    "ok" if static_organ_path else "not_found"
+                ),
+            }
+        )
+
+    return labeled_outputs
+
+
+def prefetch_jobs(data: dict) -> dict:
+    """Generations users usually ask for right after upload, with their LLM call cost."""
+    summary, text, images = data["summary"], data["text"], list(data["images"])
+    jobs = {
+        "details": (lambda: generate_detailed_text(summary, text), 1),
+        "references": (lambda: generate_references(summary), 1),
+    }
+    if 0 < len(images) <= PREFETCH_MAX_LABEL_IMAGES:
+        jobs["labeled"] = (
+            lambda: build_labeled_outputs(images, pause=yield_to_interactive),
+            len(images),
+        )
+    return jobs
+
+
 @app.post("/upload")
 async def upload_pdf(file: UploadFile = File(...)):
     """Upload a PDF, extract text and images, and return a summary."""
@@ -69,39 +129,32 @@ async def upload_pdf(file: UploadFile = File(...)):
 
     pdf_path = save_upload(file.filename, contents)
     text = extract_text(pdf_path)
-    summary = summarize_text(text)  # uses Azure OpenAI
-
-    image_paths = extract_images(pdf_path, session_id)
-
-    # ✅ Keep only images > 1 KB (1024 bytes) and delete tiny ones
-    large_image_paths: list[str] = []
-    for path in image_paths:
-        try:
-            size = os.path.getsize(path)
-            if size > 1024:
-                large_image_paths.append(path)
-            else:
-                # delete small image file, don't keep it
-                os.remove(path)
-        except OSError:
-            # if file is missing or unreadable, just skip it
-            continue
+    with interactive_request():
+        summary = summarize_text(text)  # uses Azure OpenAI
+
+    # Duplicate and tiny images are filtered out during extraction
+    image_paths, dropped_images = extract_images(pdf_path, session_id)
 
     SESSION_DATA[session_id] = {
         "pdf_path": pdf_path,
         "text": text,
         "summary": summary,
-        "images": large_image_paths,   # ✅ only big images stored
+        "images": image_paths,
+        "dropped_images": dropped_images,
         "translations": {},
         "details": None,
         "references": None,
         "labeled": [],
     }
 
+    # Speculatively generate details / references / labels in the background
+    schedule_prefetch(SESSION_DATA[session_id], prefetch_jobs(SESSION_DATA[session_id]))
+
     return {
         "session_id": session_id,
         "summary": summary,
-        "image_count": len(large_image_paths),  # ✅ only >1KB counted
+        "image_count": len(image_paths),
+        "dropped_image_count": len(dropped_images),
     }
 
 
@@ -120,7 +173,8 @@ async def get_translation(session_id: str, language: str):
         return JSONResponse(status_code=404, content={"error": "Invalid session_id"})
 
     if language not in data["translations"]:
-        data["translations"][language] = translate_summary(data["summary"], language)
+        with interactive_request():
+            data["translations"][language] = translate_summary(data["summary"], language)
     return {"language": language, "summary": data["translations"][language]}
 
 
@@ -131,7 +185,11 @@ async def get_details(session_id: str):
         return JSONResponse(status_code=404, content={"error": "Invalid session_id"})
 
     if not data["details"]:
-        data["details"] = generate_detailed_text(data["summary"], data["text"])
+        hit, details = await run_in_threadpool(take_prefetched, data, "details")
+        if not hit:
+            with interactive_request():
+                details = generate_detailed_text(data["summary"], data["text"])
+        data["details"] = details
     return {"details": data["details"]}
 
 
@@ -142,7 +200,11 @@ async def get_refs(session_id: str):
         return JSONResponse(status_code=404, content={"error": "Invalid session_id"})
 
     if not data["references"]:
-        data["references"] = generate_references(data["summary"])
+        hit, references = await run_in_threadpool(take_prefetched, data, "references")
+        if not hit:
+            with interactive_request():
+                references = generate_references(data["summary"])
+        data["references"] = references
     return {"references": data["references"]}
 
 
@@ -160,35 +222,23 @@ async def label_images(session_id: str):
     if not data:
         return JSONResponse(status_code=404, content={"error": "Invalid session_id"})
 
-    labeled_outputs = []
-
-    for img_path in data["images"]:
-        # 1) Identify organ from the extracted image
-        organ_info = identify_organ(img_path)
-        organ = organ_info.get("organ", "unknown")
-        labels = organ_info.get("labels", [])
-
-        # 2) Use static organ PNG from /static/organs
-        static_organ_path = get_static_organ_image(organ)
-
-        labeled_outputs.append(
-            {
-                "original": to_original_url(img_path),
-                "organ": organ,
-                "labels": labels,
-                "labeled_image": static_organ_path,
-                "labeled_image_url": to_organ_url(static_organ_path),
-                "image_generation_status": (
-                    "ok" if static_organ_path else "not_found"
-                ),
-            }
-        )
+    hit, labeled_outputs = await run_in_threadpool(take_prefetched, data, "labeled")
+    if not hit:
+        with interactive_request(calls=len(data["images"])):
+            labeled_outputs = build_labeled_outputs(data["images"])
 
     data["labeled"] = labeled_outputs
     SESSION_DATA[session_id] = data
 
     return {"results": labeled_outputs}
 
+
+@app.get("/prefetch/metrics")
+async def prefetch_metrics():
+    """Prefetch hit rate and LLM calls spent vs. wasted by the prefetcher."""
+    return get_prefetch_metrics()
+
+
 @app.post("/identify-organ-image")
 async def identify_organ_image(file: UploadFile = File(...)):
     """
@@ -208,7 +258,8 @@ async def identify_organ_image(file: UploadFile = File(...)):
         f.write(contents)
 
     # 2) Use helper to identify organ + get static anatomical image
-    organ_info = identify_organ_with_static_image(image_path)
+    with interactive_request():
+        organ_info = identify_organ_with_static_image(image_path)
     organ = organ_info.get("organ", "unknown")
     labels = organ_info.get("labels", [])
     static_image_path = organ_info.get("static_image_path")
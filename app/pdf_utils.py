@@ -1,8 +1,9 @@
 
+import hashlib
 import os
 import fitz  # pymupdf
 from pypdf import PdfReader
-from .config import BASE_UPLOAD_DIR
+from .config import BASE_UPLOAD_DIR, MIN_IMAGE_BYTES, MIN_IMAGE_SIDE
 
 def save_upload(filename: str, contents: bytes) -> str:
     """Save uploaded PDF bytes to disk and return the path."""
@@ -21,18 +22,60 @@ def extract_text(pdf_path: str) -> str:
         text_parts.append(t)
     return "\n".join(text_parts)
 
-def extract_images(pdf_path: str, session_id: str) -> list[str]:
-    """Extract images from the PDF and save them in a session-specific folder."""
+def extract_images(pdf_path: str, session_id: str) -> tuple[list[str], list[dict]]:
+    """
+    Extract images from the PDF and save them in a session-specific folder.
+
+    Images are filtered before they are encoded, so rejected ones are never
+    written to disk: repeated xrefs (e.g. a logo on every page), identical
+    image data under a different xref, and images below MIN_IMAGE_SIDE
+    pixels or MIN_IMAGE_BYTES of stored data. Later uses of a rejected
+    xref repeat its first reason; later uses of a kept xref are
+    "duplicate_xref".
+
+    Returns (saved image paths, dropped images as
+    {"page", "index", "xref", "reason"} dicts).
+    """
     doc = fitz.open(pdf_path)
     session_dir = os.path.join(BASE_UPLOAD_DIR, session_id, "images")
     os.makedirs(session_dir, exist_ok=True)
 
     image_paths: list[str] = []
+    dropped: list[dict] = []
+    # xref -> reason to report for its later uses
+    xref_reasons: dict[int, str] = {}
+    seen_hashes: set[str] = set()
+
     for page_index in range(len(doc)):
         page = doc[page_index]
         images = page.get_images(full=True)
         for img_index, img in enumerate(images):
-            xref = img[0]
+            xref, width, height = img[0], img[2], img[3]
+
+            reason = xref_reasons.get(xref)
+            if reason is None:
+                if min(width, height) < MIN_IMAGE_SIDE:
+                    reason = "too_small_dimensions"
+                else:
+                    raw = doc.xref_stream_raw(xref) or b""
+                    if len(raw) < MIN_IMAGE_BYTES:
+                        reason = "too_small_bytes"
+                    else:
+                        # width, height, bpc, colorspace and filter are part of the key,
+                        # so equal compressed bytes with a different layout are kept
+                        digest = hashlib.sha1(repr((img[2:6], img[8])).encode() + raw).hexdigest()
+                        if digest in seen_hashes:
+                            reason = "duplicate_content"
+                        else:
+                            seen_hashes.add(digest)
+                xref_reasons[xref] = reason or "duplicate_xref"
+
+            if reason:
+                dropped.append(
+                    {"page": page_index + 1, "index": img_index + 1, "xref": xref, "reason": reason}
+                )
+                continue
+
             pix = fitz.Pixmap(doc, xref)
             if pix.n > 4:  # CMYK or other
                 pix = fitz.Pixmap(fitz.csRGB, pix)
@@ -44,4 +87,4 @@ def extract_images(pdf_path: str, session_id: str) -> list[str]:
             image_paths.append(img_path)
             pix = None
     doc.close()
-    return image_paths
+    return image_paths, dropped
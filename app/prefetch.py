@@ -0,0 +1,299 @@
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from queue import PriorityQueue
+from typing import Any, Callable, Dict, Tuple
+
+from .config import (
+    PREFETCH_ENABLED,
+    PREFETCH_TASKS,
+    PREFETCH_MAX_CALLS_PER_MINUTE,
+    PREFETCH_IDLE_SECONDS,
+    PREFETCH_WAIT_TIMEOUT,
+    PREFETCH_RESULT_TTL,
+)
+
+# A prefetch job: (function producing the result, number of LLM calls it costs)
+PrefetchJob = Tuple[Callable[[], Any], int]
+
+# -------------------------------------------------------------------
+# Shared state
+# -------------------------------------------------------------------
+_lock = threading.Lock()
+_idle = threading.Condition(_lock)
+_queue: PriorityQueue = PriorityQueue()
+_seq = itertools.count()
+_worker: threading.Thread | None = None
+_running: dict | None = None  # state of the job the worker is executing
+
+_active_interactive = 0
+_last_interactive = 0.0
+_recent_calls: deque[float] = deque()
+
+# id(state) -> (session data, task, state) for finished results not yet collected
+_uncollected: dict[int, tuple[dict, str, dict]] = {}
+
+PREFETCH_METRICS: dict[str, int] = {
+    "scheduled": 0,      # jobs queued after an upload
+    "completed": 0,      # jobs whose result was stored in the session
+    "failed": 0,         # jobs that raised or returned an error result
+    "cancelled": 0,      # jobs claimed by the user before they started
+    "skipped_quota": 0,  # jobs costing more than the whole per-minute budget
+    "deferred_quota": 0,  # times a job waited for room in the call budget
+    "expired": 0,        # finished results never collected within PREFETCH_RESULT_TTL
+    "hits": 0,           # endpoint served a prefetched result
+    "misses": 0,         # endpoint had to generate the result itself
+    "llm_calls": 0,      # LLM calls spent by the prefetcher
+    "wasted_llm_calls": 0,  # calls spent on failed, abandoned or expired jobs
+}
+
+
+# -------------------------------------------------------------------
+# Interactive requests take precedence over prefetch jobs
+# -------------------------------------------------------------------
+@contextmanager
+def interactive_request(calls: int = 1):
+    """
+    Mark an interactive (user-facing) request making `calls` LLM calls as running.
+    The prefetch worker does not start a new job while any are active, and the
+    calls count against the shared per-minute budget.
+    """
+    global _active_interactive, _last_interactive
+    with _lock:
+        _active_interactive += 1
+        _record_calls(calls)
+    try:
+        yield
+    finally:
+        with _lock:
+            _active_interactive -= 1
+            _last_interactive = time.monotonic()
+            _idle.notify_all()
+
+
+def _wait_until_idle() -> None:
+    with _idle:
+        while True:
+            if _active_interactive == 0:
+                remaining = PREFETCH_IDLE_SECONDS - (time.monotonic() - _last_interactive)
+                if remaining <= 0:
+                    return
+                _idle.wait(remaining)
+            else:
+                _idle.wait()
+
+
+def _record_calls(count: int) -> None:
+    """Add `count` LLM calls to the last-minute window (caller holds _lock)."""
+    now = time.monotonic()
+    while _recent_calls and now - _recent_calls[0] > 60:
+        _recent_calls.popleft()
+    _recent_calls.extend([now] * count)
+
+
+def _mark_progress() -> None:
+    with _lock:
+        if _running is not None:
+            _running["progress"] = time.monotonic()
+
+
+def yield_to_interactive() -> None:
+    """
+    Called by long prefetch jobs between LLM calls to let user requests go
+    first; also tells endpoints waiting on the job that it is making progress.
+    """
+    _mark_progress()
+    _wait_until_idle()
+    _mark_progress()
+
+
+def _reserve_calls(cost: int) -> bool:
+    """Reserve `cost` LLM calls if the shared budget has room (caller holds _lock)."""
+    _record_calls(0)
+    if 0 < PREFETCH_MAX_CALLS_PER_MINUTE < len(_recent_calls) + cost:
+        return False
+    _record_calls(cost)
+    return True
+
+
+def _expire_uncollected() -> None:
+    """Drop finished results nobody collected in time (caller holds _lock)."""
+    now = time.monotonic()
+    for key, (data, task, state) in list(_uncollected.items()):
+        if now - state["finished"] < PREFETCH_RESULT_TTL:
+            continue
+        del _uncollected[key]
+        data["prefetched"].pop(task, None)
+        state["status"] = "expired"
+        PREFETCH_METRICS["expired"] += 1
+        PREFETCH_METRICS["wasted_llm_calls"] += state["cost"]
+
+
+def _looks_failed(result: Any) -> bool:
+    """
+    ai_utils reports failures instead of raising: text generators return
+    'Error: ...' strings, and identify_organ returns organ 'unknown' with
+    no labels, so a labeled result where every image came back like that
+    is treated as failed.
+    """
+    if isinstance(result, str):
+        return result.startswith("Error:")
+    if isinstance(result, list) and len(result) == 1 and isinstance(result[0], str):
+        return result[0].startswith("Error:")
+    if isinstance(result, list) and result and all(isinstance(r, dict) for r in result):
+        return all(r.get("organ") == "unknown" and not r.get("labels") for r in result)
+    return False
+
+
+# -------------------------------------------------------------------
+# Worker
+# -------------------------------------------------------------------
+def _start_job(state: dict, cost: int) -> bool:
+    """
+    Wait for idle time and room in the call budget, then mark the job running.
+    Returns False if the job was claimed meanwhile or can never fit the budget.
+    """
+    while True:
+        _wait_until_idle()
+        with _idle:
+            if state["status"] != "queued":
+                # claimed by an interactive request in the meantime
+                return False
+            if 0 < PREFETCH_MAX_CALLS_PER_MINUTE < cost:
+                PREFETCH_METRICS["skipped_quota"] += 1
+                state["status"] = "skipped"
+                return False
+            if _reserve_calls(cost):
+                state["status"] = "running"
+                state["progress"] = time.monotonic()
+                PREFETCH_METRICS["llm_calls"] += cost
+                return True
+            # over budget: retry once the oldest call leaves the window
+            PREFETCH_METRICS["deferred_quota"] += 1
+            _idle.wait(max(60 - (time.monotonic() - _recent_calls[0]), 0.05))
+
+
+def _run_worker() -> None:
+    global _running
+    while True:
+        _priority, _n, data, task, state, job = _queue.get()
+        func, cost = job
+
+        if not _start_job(state, cost):
+            with _lock:
+                state["done"].set()
+            continue
+
+        _running = state
+        try:
+            result = func()
+            ok = not _looks_failed(result)
+        except Exception as e:
+            print(f"Unexpected error in prefetch of {task}:", e)
+            result, ok = None, False
+
+        with _lock:
+            _running = None
+            if state["status"] == "abandoned":
+                # the endpoint stopped waiting and generated it itself
+                PREFETCH_METRICS["wasted_llm_calls"] += cost
+            elif ok:
+                data["prefetched"][task] = result
+                state["status"] = "done"
+                state["finished"] = time.monotonic()
+                _uncollected[id(state)] = (data, task, state)
+                PREFETCH_METRICS["completed"] += 1
+            else:
+                state["status"] = "failed"
+                PREFETCH_METRICS["failed"] += 1
+                PREFETCH_METRICS["wasted_llm_calls"] += cost
+            state["done"].set()
+
+
+def _ensure_worker() -> None:
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="prefetch", daemon=True)
+            _worker.start()
+
+
+# -------------------------------------------------------------------
+# Public API
+# -------------------------------------------------------------------
+def schedule_prefetch(data: dict, jobs: Dict[str, PrefetchJob]) -> None:
+    """
+    Queue background generation of `jobs` for one session.
+    Results land in data["prefetched"][task]; tasks not listed in
+    PREFETCH_TASKS are ignored.
+    """
+    data.setdefault("prefetched", {})
+    data.setdefault("prefetch", {})
+    if not PREFETCH_ENABLED:
+        return
+
+    with _lock:
+        _expire_uncollected()
+
+    for priority, task in enumerate(PREFETCH_TASKS):
+        if task not in jobs:
+            continue
+        state = {"status": "queued", "done": threading.Event(), "cost": jobs[task][1]}
+        with _lock:
+            data["prefetch"][task] = state
+            PREFETCH_METRICS["scheduled"] += 1
+        _queue.put((priority, next(_seq), data, task, state, jobs[task]))
+
+    if data["prefetch"]:
+        _ensure_worker()
+
+
+def take_prefetched(data: dict, task: str) -> Tuple[bool, Any]:
+    """
+    Return (True, result) if `task` was prefetched for this session,
+    waiting for it while it is running and making progress. Otherwise
+    cancel any queued job and return (False, None) so the caller
+    generates it. Blocks, so async endpoints run it in a threadpool.
+    """
+    with _lock:
+        state = data.get("prefetch", {}).get(task)
+        if state is None:
+            return False, None
+        if state["status"] == "queued":
+            state["status"] = "cancelled"
+            PREFETCH_METRICS["cancelled"] += 1
+        done = state["done"]
+
+    while state["status"] == "running":
+        # give up only if the job has gone PREFETCH_WAIT_TIMEOUT without progress
+        remaining = PREFETCH_WAIT_TIMEOUT - (time.monotonic() - state["progress"])
+        if remaining <= 0 or done.wait(remaining):
+            break
+
+    with _lock:
+        data["prefetch"].pop(task, None)
+        if state["status"] == "running":
+            # timed out; the worker discards the result when it finishes
+            state["status"] = "abandoned"
+        if task in data["prefetched"]:
+            _uncollected.pop(id(state), None)
+            PREFETCH_METRICS["hits"] += 1
+            return True, data["prefetched"].pop(task)
+        PREFETCH_METRICS["misses"] += 1
+        return False, None
+
+
+def get_prefetch_metrics() -> dict:
+    """Counters plus hit rate and finished results still waiting to be collected."""
+    with _lock:
+        _expire_uncollected()
+        m = dict(PREFETCH_METRICS)
+        m["uncollected"] = len(_uncollected)
+        m["uncollected_llm_calls"] = sum(s["cost"] for _, _, s in _uncollected.values())
+    lookups = m["hits"] + m["misses"]
+    m["hit_rate"] = round(m["hits"] / lookups, 3) if lookups else None
+    m["enabled"] = PREFETCH_ENABLED
+    m["tasks"] = list(PREFETCH_TASKS)
+    return m
@@ -0,0 +1,246 @@
+"""
+Micro-benchmarks for app/pdf_utils.py.
+
+Generates a synthetic PDF corpus (varying page count, text density and
+image count/size), adds the sample PDFs shipped in uploads/,
+and measures wall time, peak Python memory (tracemalloc) and output
+bytes for save_upload, extract_text and extract_images.
+
+Run from the project root:
+
+    python -m benchmarks.bench_pdf_utils                    # compare to baseline
+    python -m benchmarks.bench_pdf_utils --update-baseline  # record new baseline
+
+The committed baseline.json stores only output bytes, which do not depend
+on the machine (write it with --update-baseline --bytes-only). A baseline
+recorded without --bytes-only also checks wall time and peak memory.
+
+Exits with status 1 if there is no baseline, if any case is slower / uses
+more memory than the baseline by more than --tolerance, if it writes more
+output bytes, or if cases are missing from either the baseline or this run.
+Peak memory only covers Python allocations, not memory held inside MuPDF.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+import fitz  # pymupdf
+
+from app.config import BASE_UPLOAD_DIR
+from app.pdf_utils import save_upload, extract_text, extract_images
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+SAMPLES_DIR = BASE_UPLOAD_DIR
+
+# Sample PDFs tracked in uploads/, pinned by name so the corpus does not
+# change with whatever users have uploaded.
+SAMPLE_PDFS = [
+    "Anatomy+of+the+Heart.pdf",
+    "Heart_brain.pdf",
+    "The Heart!.pdf",
+]
+
+WORDS = (
+    "heart atrium ventricle valve aorta artery vein lung bronchus alveolus "
+    "brain cortex neuron liver kidney nephron blood pressure cardiac output"
+).split()
+
+# name: (pages, lines of text per page, images per page, image side in px, same image on every page)
+SYNTHETIC_CASES = {
+    "1p_text_sparse": (1, 5, 0, 0, False),
+    "1p_text_dense": (1, 60, 0, 0, False),
+    "10p_text_dense": (10, 60, 0, 0, False),
+    "50p_text_dense": (50, 60, 0, 0, False),
+    "10p_small_images": (10, 10, 3, 32, False),
+    "10p_large_images": (10, 10, 3, 512, False),
+    "10p_repeated_logo": (10, 10, 1, 128, True),
+    "50p_mixed": (50, 30, 2, 256, False),
+}
+
+
+# -------------------------------------------------------------------
+# Synthetic corpus
+# -------------------------------------------------------------------
+def _noise_pixmap(rng: random.Random, side: int) -> fitz.Pixmap:
+    """Random RGB pixels so the image does not compress away."""
+    return fitz.Pixmap(fitz.csRGB, side, side, rng.randbytes(side * side * 3), False)
+
+
+def make_synthetic_pdf(path: str, pages: int, lines: int, images: int,
+                       side: int, repeated: bool, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    doc = fitz.open()
+    logo = _noise_pixmap(rng, side) if images and repeated else None
+
+    for _ in range(pages):
+        page = doc.new_page()
+        if lines:
+            text = [" ".join(rng.choices(WORDS, k=10)) for _ in range(lines)]
+            page.insert_text((40, 40), text, fontsize=9, lineheight=12 / 9)
+
+        for i in range(images):
+            pix = logo or _noise_pixmap(rng, side)
+            x0 = 40 + i * 170
+            page.insert_image(fitz.Rect(x0, 600, x0 + 150, 750), pixmap=pix)
+
+    doc.save(path, deflate=True)
+    doc.close()
+
+
+def build_corpus(out_dir: str) -> dict[str, str]:
+    corpus = {}
+    for name, params in SYNTHETIC_CASES.items():
+        path = os.path.join(out_dir, f"{name}.pdf")
+        make_synthetic_pdf(path, *params)
+        corpus[name] = path
+
+    for filename in SAMPLE_PDFS:
+        corpus["sample_" + os.path.splitext(filename)[0]] = os.path.join(SAMPLES_DIR, filename)
+    return corpus
+
+
+# -------------------------------------------------------------------
+# Measurement
+# -------------------------------------------------------------------
+def _measure(func, repeat: int):
+    """Return (median wall seconds, peak KiB, last result)."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak / 1024, result
+
+
+def bench_pdf(pdf_path: str, repeat: int) -> dict[str, dict]:
+    with open(pdf_path, "rb") as f:
+        contents = f.read()
+
+    upload_name = f"bench-{uuid.uuid4()}.pdf"
+    sessions: list[str] = []
+
+    def run_save():
+        return save_upload(upload_name, contents)
+
+    def run_images():
+        session_id = f"bench-{uuid.uuid4()}"
+        sessions.append(session_id)
+        image_paths, _dropped = extract_images(pdf_path, session_id)
+        return image_paths
+
+    results = {}
+    try:
+        wall, peak, saved = _measure(run_save, repeat)
+        results["save_upload"] = {
+            "wall_s": wall, "peak_kb": peak, "output_bytes": os.path.getsize(saved),
+        }
+
+        wall, peak, text = _measure(lambda: extract_text(pdf_path), repeat)
+        results["extract_text"] = {
+            "wall_s": wall, "peak_kb": peak, "output_bytes": len(text.encode("utf-8")),
+        }
+
+        wall, peak, paths = _measure(run_images, repeat)
+        results["extract_images"] = {
+            "wall_s": wall, "peak_kb": peak,
+            "output_bytes": sum(os.path.getsize(p) for p in paths),
+        }
+    finally:
+        upload_path = os.path.join(BASE_UPLOAD_DIR, upload_name)
+        if os.path.exists(upload_path):
+            os.remove(upload_path)
+        for session_id in sessions:
+            shutil.rmtree(os.path.join(BASE_UPLOAD_DIR, session_id), ignore_errors=True)
+    return results
+
+
+# -------------------------------------------------------------------
+# Baseline comparison
+# -------------------------------------------------------------------
+def compare(current: dict, baseline: dict, tolerance: float,
+            min_wall: float) -> list[str]:
+    problems = [f"{key}: missing from this run" for key in sorted(baseline.keys() - current.keys())]
+    problems += [f"{key}: not in baseline" for key in sorted(current.keys() - baseline.keys())]
+    for key, cur in current.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if "wall_s" in base and cur["wall_s"] > max(base["wall_s"], min_wall) * (1 + tolerance):
+            problems.append(f"{key}: wall {base['wall_s']:.4f}s -> {cur['wall_s']:.4f}s")
+        if "peak_kb" in base and cur["peak_kb"] > base["peak_kb"] * (1 + tolerance):
+            problems.append(f"{key}: peak {base['peak_kb']:.0f}KiB -> {cur['peak_kb']:.0f}KiB")
+        if cur["output_bytes"] > base["output_bytes"]:
+            problems.append(f"{key}: output {base['output_bytes']}B -> {cur['output_bytes']}B")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per function")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown / memory growth, e.g. 0.25 = 25%%")
+    parser.add_argument("--min-wall", type=float, default=0.005,
+                        help="ignore timing noise below this many seconds")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--bytes-only", action="store_true",
+                        help="with --update-baseline, store only machine-independent output bytes")
+    parser.add_argument("--only", help="run only cases whose name contains this")
+    args = parser.parse_args()
+
+    current: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = build_corpus(tmp)
+        for name, path in corpus.items():
+            if args.only and args.only not in name:
+                continue
+            for func_name, stats in bench_pdf(path, args.repeat).items():
+                key = f"{name}/{func_name}"
+                current[key] = stats
+                print(f"{key:45s} {stats['wall_s'] * 1000:9.2f} ms "
+                      f"{stats['peak_kb']:9.0f} KiB {stats['output_bytes']:11d} B")
+
+    if args.update_baseline:
+        if args.bytes_only:
+            current = {k: {"output_bytes": v["output_bytes"]} for k, v in current.items()}
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline found at {args.baseline}; run with --update-baseline first.")
+        return 1
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.only:
+        baseline = {k: v for k, v in baseline.items() if args.only in k.split("/")[0]}
+
+    problems = compare(current, baseline, args.tolerance, args.min_wall)
+    if problems:
+        print("\nRegressions:")
+        for p in problems:
+            print("  " + p)
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+import os
+import random
+
+import fitz  # pymupdf
+
+from app import pdf_utils
+
+
+def noise_image(side: int, seed: int = 0) -> fitz.Pixmap:
+    """Random RGB pixels, so the stored image is well over MIN_IMAGE_BYTES."""
+    data = random.Random(seed).randbytes(side * side * 3)
+    return fitz.Pixmap(fitz.csRGB, side, side, data, False)
+
+
+def flat_image(side: int) -> fitz.Pixmap:
+    """A single colour, which compresses far below MIN_IMAGE_BYTES."""
+    return fitz.Pixmap(fitz.csRGB, side, side, bytes(side * side * 3), False)
+
+
+def build_pdf(path, pages: list[list[fitz.Pixmap]]) -> str:
+    """One page per entry, with its images laid out left to right.
+    Inserting the same Pixmap on several pages reuses one xref."""
+    doc = fitz.open()
+    for images in pages:
+        page = doc.new_page()
+        for i, pix in enumerate(images):
+            page.insert_image(fitz.Rect(40 + i * 110, 50, 140 + i * 110, 150), pixmap=pix)
+    doc.save(str(path), deflate=True)
+    doc.close()
+    return str(path)
+
+
+def test_extract_images_drops_repeated_logo_and_tiny_image(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_utils, "BASE_UPLOAD_DIR", str(tmp_path))
+    logo, icon = noise_image(128), noise_image(8, seed=1)
+    pdf_path = build_pdf(tmp_path / "logo.pdf", [[logo, icon], [logo], [logo]])
+
+    paths, dropped = pdf_utils.extract_images(pdf_path, "session")
+
+    assert [os.path.basename(p) for p in paths] == ["page1_img1.png"]
+    assert os.listdir(tmp_path / "session" / "images") == ["page1_img1.png"]
+    assert [(d["page"], d["index"], d["reason"]) for d in dropped] == [
+        (1, 2, "too_small_dimensions"),
+        (2, 1, "duplicate_xref"),
+        (3, 1, "duplicate_xref"),
+    ]
+
+
+def test_extract_images_drops_small_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_utils, "BASE_UPLOAD_DIR", str(tmp_path))
+    pdf_path = build_pdf(tmp_path / "flat.pdf", [[flat_image(64)]])
+
+    paths, dropped = pdf_utils.extract_images(pdf_path, "session")
+
+    assert paths == []
+    assert [d["reason"] for d in dropped] == ["too_small_bytes"]
+
+
+def test_repeated_rejected_xref_keeps_its_reason(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_utils, "BASE_UPLOAD_DIR", str(tmp_path))
+    logo, icon, flat = noise_image(128), noise_image(8, seed=1), flat_image(64)
+    pdf_path = build_pdf(tmp_path / "repeat.pdf", [[logo, icon, flat], [logo, icon, flat]])
+
+    paths, dropped = pdf_utils.extract_images(pdf_path, "session")
+
+    assert [os.path.basename(p) for p in paths] == ["page1_img1.png"]
+    assert [(d["page"], d["index"], d["reason"]) for d in dropped] == [
+        (1, 2, "too_small_dimensions"),
+        (1, 3, "too_small_bytes"),
+        (2, 1, "duplicate_xref"),
+        (2, 2, "too_small_dimensions"),
+        (2, 3, "too_small_bytes"),
+    ]
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import pytest
+
+from app import prefetch
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(prefetch, "PREFETCH_ENABLED", True)
+    monkeypatch.setattr(prefetch, "PREFETCH_TASKS", ["details", "references"])
+    monkeypatch.setattr(prefetch, "PREFETCH_IDLE_SECONDS", 0.01)
+    monkeypatch.setattr(prefetch, "PREFETCH_MAX_CALLS_PER_MINUTE", 0)
+    monkeypatch.setattr(prefetch, "PREFETCH_WAIT_TIMEOUT", 5)
+    monkeypatch.setattr(prefetch, "_last_interactive", 0.0)
+    for key in prefetch.PREFETCH_METRICS:
+        prefetch.PREFETCH_METRICS[key] = 0
+    prefetch._recent_calls.clear()
+    prefetch._uncollected.clear()
+
+
+def schedule(jobs):
+    data = {}
+    prefetch.schedule_prefetch(data, jobs)
+    states = dict(data["prefetch"])
+    return data, states
+
+
+def test_hit_after_completion():
+    data, states = schedule({"details": (lambda: "D", 1)})
+    assert states["details"]["done"].wait(5)
+
+    assert prefetch.get_prefetch_metrics()["uncollected_llm_calls"] == 1
+    assert prefetch.take_prefetched(data, "details") == (True, "D")
+
+    m = prefetch.get_prefetch_metrics()
+    assert (m["hits"], m["misses"], m["llm_calls"], m["wasted_llm_calls"]) == (1, 0, 1, 0)
+    assert m["uncollected"] == 0
+
+
+def test_waits_for_running_job():
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+        return "D"
+
+    data, _ = schedule({"details": (job, 1)})
+    assert started.wait(5)
+    threading.Timer(0.1, release.set).start()
+
+    assert prefetch.take_prefetched(data, "details") == (True, "D")
+
+
+def test_queued_job_is_cancelled_when_claimed():
+    calls = []
+    with prefetch.interactive_request():
+        data, states = schedule({"details": (lambda: calls.append(1) or "D", 1)})
+        assert prefetch.take_prefetched(data, "details") == (False, None)
+    assert states["details"]["done"].wait(5)
+
+    assert calls == []
+    m = prefetch.get_prefetch_metrics()
+    assert (m["cancelled"], m["misses"], m["llm_calls"]) == (1, 1, 0)
+
+
+def test_error_result_counts_as_failed():
+    data, states = schedule({"references": (lambda: ["Error: no network"], 2)})
+    assert states["references"]["done"].wait(5)
+
+    assert prefetch.take_prefetched(data, "references") == (False, None)
+    m = prefetch.get_prefetch_metrics()
+    assert (m["failed"], m["completed"], m["wasted_llm_calls"]) == (1, 0, 2)
+
+
+def test_job_larger_than_budget_is_skipped(monkeypatch):
+    monkeypatch.setattr(prefetch, "PREFETCH_MAX_CALLS_PER_MINUTE", 2)
+    calls = []
+    data, states = schedule({"details": (lambda: calls.append(1) or "D", 3)})
+    assert states["details"]["done"].wait(5)
+
+    assert calls == []
+    assert prefetch.get_prefetch_metrics()["skipped_quota"] == 1
+
+
+def test_job_over_budget_is_deferred(monkeypatch):
+    monkeypatch.setattr(prefetch, "PREFETCH_MAX_CALLS_PER_MINUTE", 1)
+    # an interactive call made almost a minute ago fills the budget
+    prefetch._recent_calls.append(time.monotonic() - 59.8)
+
+    data, states = schedule({"details": (lambda: "D", 1)})
+    assert states["details"]["done"].wait(5)
+
+    m = prefetch.get_prefetch_metrics()
+    assert m["deferred_quota"] >= 1
+    assert m["completed"] == 1
+
+
+def test_interactive_calls_use_shared_budget(monkeypatch):
+    monkeypatch.setattr(prefetch, "PREFETCH_MAX_CALLS_PER_MINUTE", 1)
+    with prefetch.interactive_request():
+        pass
+    with prefetch._lock:
+        assert not prefetch._reserve_calls(1)
+
+
+def test_worker_waits_for_interactive_request():
+    started = threading.Event()
+    with prefetch.interactive_request():
+        data, states = schedule({"details": (lambda: started.set() or "D", 1)})
+        assert not started.wait(0.2)
+    assert started.wait(5)
+    assert states["details"]["done"].wait(5)
+    assert prefetch.take_prefetched(data, "details") == (True, "D")
+
+
+def test_uncollected_result_expires_as_wasted(monkeypatch):
+    data, states = schedule({"details": (lambda: "D", 1)})
+    assert states["details"]["done"].wait(5)
+
+    monkeypatch.setattr(prefetch, "PREFETCH_RESULT_TTL", 0)
+    m = prefetch.get_prefetch_metrics()
+    assert (m["expired"], m["wasted_llm_calls"], m["uncollected"]) == (1, 1, 0)
+    assert prefetch.take_prefetched(data, "details") == (False, None)
+
+
+def test_labeled_result_with_only_failed_identifications_counts_as_failed(monkeypatch):
+    monkeypatch.setattr(prefetch, "PREFETCH_TASKS", ["labeled"])
+    unknown = {"organ": "unknown", "labels": [], "image_generation_status": "not_found"}
+    data, states = schedule({"labeled": (lambda: [dict(unknown), dict(unknown)], 2)})
+    assert states["labeled"]["done"].wait(5)
+
+    assert prefetch.take_prefetched(data, "labeled") == (False, None)
+    m = prefetch.get_prefetch_metrics()
+    assert (m["failed"], m["hits"], m["wasted_llm_calls"]) == (1, 0, 2)
+
+
+def test_labeled_result_with_one_identification_is_kept(monkeypatch):
+    monkeypatch.setattr(prefetch, "PREFETCH_TASKS", ["labeled"])
+    results = [{"organ": "unknown", "labels": []}, {"organ": "heart", "labels": ["aorta"]}]
+    data, states = schedule({"labeled": (lambda: results, 2)})
+    assert states["labeled"]["done"].wait(5)
+
+    assert prefetch.take_prefetched(data, "labeled") == (True, results)
+
+
+def test_keeps_waiting_for_job_making_progress(monkeypatch):
+    monkeypatch.setattr(prefetch, "PREFETCH_WAIT_TIMEOUT", 0.2)
+
+    def job():
+        for _ in range(4):
+            time.sleep(0.1)
+            prefetch.yield_to_interactive()
+        return "L"
+
+    data, _ = schedule({"details": (job, 4)})
+    time.sleep(0.05)
+
+    assert prefetch.take_prefetched(data, "details") == (True, "L")
+
+
+def test_stalled_job_is_abandoned_as_wasted(monkeypatch):
+    monkeypatch.setattr(prefetch, "PREFETCH_WAIT_TIMEOUT", 0.1)
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+        return "D"
+
+    data, states = schedule({"details": (job, 3)})
+    assert started.wait(5)
+    assert prefetch.take_prefetched(data, "details") == (False, None)
+
+    release.set()
+    assert states["details"]["done"].wait(5)
+    m = prefetch.get_prefetch_metrics()
+    assert (m["misses"], m["completed"], m["wasted_llm_calls"]) == (1, 0, 3)